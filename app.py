@@ -9,9 +9,13 @@ import os
 import qrcode
 import io
 import socket
+import time
 
-from weather import WeatherAPI
-from utils import get_weather_icon, temperature_color, wind_direction_icon
+from weather import WeatherAPI, payload_fingerprint
+from utils import get_daily_forecasts, get_weather_icon, get_weather_icons, temperature_color, wind_direction_icon
+
+# Start of this script run, used to report time to first content
+page_start = time.perf_counter()
 
 # Page configuration
 st.set_page_config(
@@ -65,6 +69,9 @@ if 'last_update' not in st.session_state:
     st.session_state.last_update = datetime.datetime.now()
 if 'demo_mode' not in st.session_state:
     st.session_state.demo_mode = False
+if 'refresh_stats' not in st.session_state:
+    # Forecast refreshes of the city and units already on screen, and how many were no-ops
+    st.session_state.refresh_stats = {'refreshes': 0, 'unchanged': 0, 'not_modified': 0}
 
 # Function to load demo data
 def get_demo_weather(city="London", units="metric"):
@@ -184,6 +191,180 @@ def get_demo_forecast(city="London", units="metric"):
     
     return sample_forecast
 
+def render_current_weather(weather_data):
+    """
+    Render the current conditions section
+    """
+    # Location information
+    st.header(f"Current Weather in {weather_data['name']}, {weather_data['sys']['country']}")
+    
+    # Create columns for layout
+    col1, col2, col3 = st.columns([1, 1, 1])
+    
+    # Column 1: Basic weather info and icon
+    with col1:
+        weather_condition = weather_data['weather'][0]['description'].capitalize()
+        
+        # Weather icon display
+        weather_icon = get_weather_icon(weather_data['weather'][0]['icon'])
+        st.markdown(f'<div style="text-align: center; font-size: 100px;">{weather_icon}</div>', unsafe_allow_html=True)
+        
+        st.markdown(f"<h2 style='text-align: center;'>{weather_condition}</h2>", unsafe_allow_html=True)
+        
+        # Display temperature with color
+        temp = weather_data['main']['temp']
+        temp_unit = "°C" if st.session_state.unit == 'metric' else "°F"
+        temp_color = temperature_color(temp, st.session_state.unit)
+        st.markdown(f"<h1 style='text-align: center; color: {temp_color};'>{temp:.1f}{temp_unit}</h1>", unsafe_allow_html=True)
+        
+        # Feels like temperature
+        feels_like = weather_data['main']['feels_like']
+        st.markdown(f"<p style='text-align: center;'>Feels like: {feels_like:.1f}{temp_unit}</p>", unsafe_allow_html=True)
+    
+    # Column 2: Additional weather metrics
+    with col2:
+        st.subheader("Details")
+        
+        # Min/Max temperature
+        min_temp = weather_data['main']['temp_min']
+        max_temp = weather_data['main']['temp_max']
+        st.write(f"Min/Max: {min_temp:.1f}{temp_unit} / {max_temp:.1f}{temp_unit}")
+        
+        # Humidity
+        humidity = weather_data['main']['humidity']
+        st.write(f"Humidity: {humidity}%")
+        
+        # Pressure
+        pressure = weather_data['main']['pressure']
+        st.write(f"Pressure: {pressure} hPa")
+        
+        # Visibility
+        visibility = weather_data.get('visibility', 0) / 1000  # Convert to km
+        st.write(f"Visibility: {visibility:.1f} km")
+        
+        # Cloudiness
+        clouds = weather_data['clouds']['all']
+        st.write(f"Cloudiness: {clouds}%")
+
+    # Column 3: Wind information with visual indicator
+    with col3:
+        st.subheader("Wind")
+        
+        # Wind speed
+        wind_speed = weather_data['wind']['speed']
+        speed_unit = "m/s" if st.session_state.unit == 'metric' else "mph"
+        st.write(f"Speed: {wind_speed} {speed_unit}")
+        
+        # Wind direction
+        wind_deg = weather_data.get('wind', {}).get('deg', 0)
+        direction_icon = wind_direction_icon(wind_deg)
+        st.markdown(f"<p>Direction: {wind_deg}° {direction_icon}</p>", unsafe_allow_html=True)
+        
+        # Wind gust if available
+        if 'gust' in weather_data.get('wind', {}):
+            wind_gust = weather_data['wind']['gust']
+            st.write(f"Gust: {wind_gust} {speed_unit}")
+        
+        # Sunrise/Sunset times
+        timezone_offset = weather_data['timezone']
+        sunrise_time = datetime.datetime.fromtimestamp(weather_data['sys']['sunrise'] + timezone_offset - 3600)
+        sunset_time = datetime.datetime.fromtimestamp(weather_data['sys']['sunset'] + timezone_offset - 3600)
+        
+        st.write(f"Sunrise: {sunrise_time.strftime('%H:%M')}")
+        st.write(f"Sunset: {sunset_time.strftime('%H:%M')}")
+
+def build_forecast_view(forecast_data):
+    """
+    Process forecast data into the daily picks, card icons and trend chart.
+    
+    Kept in session state and reused until the forecast changes.
+    """
+    temp_unit = "°C" if st.session_state.unit == 'metric' else "°F"
+    
+    # Get daily forecasts (taking the noon forecast for each day)
+    daily_forecasts = get_daily_forecasts(forecast_data['list'])
+    
+    # Map all card icons in one pass
+    forecast_icons = get_weather_icons([item['weather'][0]['icon'] for _, item in daily_forecasts])
+    
+    # Prepare data for the chart
+    chart_data = []
+    
+    for i, forecast_item in enumerate(forecast_data['list'][:16]):  # Show first 48 hours (16 entries)
+        forecast_dt = datetime.datetime.fromtimestamp(forecast_item['dt'])
+        temp = forecast_item['main']['temp']
+        feels_like = forecast_item['main']['feels_like']
+        
+        chart_data.append({
+            'Time': forecast_dt, 
+            'Temperature': temp,
+            'Feels Like': feels_like
+        })
+    
+    df = pd.DataFrame(chart_data)
+    
+    # Create interactive temperature chart
+    fig = px.line(df, x='Time', y=['Temperature', 'Feels Like'], 
+                  labels={'value': f'Temperature ({temp_unit})', 'variable': 'Metric'},
+                  template='plotly_white')
+    
+    fig.update_layout(
+        height=400,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        margin=dict(l=10, r=10, t=30, b=10)
+    )
+    
+    return {
+        'daily_forecasts': daily_forecasts,
+        'icons': forecast_icons,
+        'chart': fig,
+    }
+
+def render_forecast(forecast_view):
+    """
+    Render the forecast cards and the temperature trend chart
+    """
+    temp_unit = "°C" if st.session_state.unit == 'metric' else "°F"
+    speed_unit = "m/s" if st.session_state.unit == 'metric' else "mph"
+    
+    daily_forecasts = forecast_view['daily_forecasts']
+    forecast_icons = forecast_view['icons']
+    
+    # Create forecast cards using columns
+    forecast_cols = st.columns(len(daily_forecasts))
+    
+    for i, (date, forecast_item) in enumerate(daily_forecasts):
+        with forecast_cols[i]:
+            # Date
+            st.write(f"**{date.strftime('%a, %b %d')}**")
+            
+            # Weather icon
+            weather_icon = forecast_icons[i]
+            st.markdown(f'<div style="text-align: center; font-size: 40px;">{weather_icon}</div>', unsafe_allow_html=True)
+            
+            # Weather description
+            weather_desc = forecast_item['weather'][0]['description'].capitalize()
+            st.write(f"{weather_desc}")
+            
+            # Temperature
+            temp = forecast_item['main']['temp']
+            st.write(f"**{temp:.1f}{temp_unit}**")
+            
+            # Additional info
+            st.write(f"Humidity: {forecast_item['main']['humidity']}%")
+            wind_speed = forecast_item['wind']['speed']
+            st.write(f"Wind: {wind_speed} {speed_unit}")
+
+    # Temperature trend chart
+    st.subheader("Temperature Trend (48 hours)")
+    st.plotly_chart(forecast_view['chart'], use_container_width=True)
+
+def use_demo_data():
+    """
+    Whether to serve simulated data instead of calling the API
+    """
+    return st.session_state.demo_mode or not api_initialized
+
 # Try to initialize WeatherAPI with OpenWeather API key from environment
 try:
     weather_api = WeatherAPI()
@@ -236,6 +417,9 @@ with st.sidebar:
     # Show last update time
     st.write(f"Last updated: {st.session_state.last_update.strftime('%Y-%m-%d %H:%M:%S')}")
     
+    # Filled in once the page has rendered
+    timing_placeholder = st.empty()
+    
     # Add a small space
     st.write("")
     
@@ -266,11 +450,15 @@ with st.sidebar:
     # Removed information about API key activation
 
 # Main content
-if search_button or 'weather_data' not in st.session_state:
-    with st.spinner("Fetching weather data..."):
+fetch_requested = search_button or 'weather_data' not in st.session_state
+forecast_pending = False
+
+# Stage 1: current conditions
+if fetch_requested:
+    with st.spinner("Fetching current weather..."):
         try:
             # Check if in demo mode or API failed
-            if st.session_state.demo_mode or not api_initialized:
+            if use_demo_data():
                 # Show notification that we're using demo data
                 if not st.session_state.get('demo_notification_shown', False):
                     st.info("🧪 Using demo data - weather information is simulated")
@@ -278,16 +466,19 @@ if search_button or 'weather_data' not in st.session_state:
                 
                 # Get simulated weather data
                 current_weather = get_demo_weather(city_name, st.session_state.unit)
-                forecast = get_demo_forecast(city_name, st.session_state.unit)
+                fetched_at = datetime.datetime.now()
             else:
-                # Get real weather data from API
-                current_weather = weather_api.get_current_weather(city_name, st.session_state.unit)
-                forecast = weather_api.get_forecast(city_name, st.session_state.unit)
+                # Get real weather data from API - an explicit search skips the
+                # shared cache, a first load may be served from it
+                current_weather = weather_api.get_current_weather(
+                    city_name, st.session_state.unit, refresh=search_button
+                )
+                fetched_at = datetime.datetime.fromtimestamp(weather_api.last_fetched_at)
             
             # Store in session state
             st.session_state.weather_data = current_weather
-            st.session_state.forecast_data = forecast
-            st.session_state.last_update = datetime.datetime.now()
+            st.session_state.last_update = fetched_at
+            forecast_pending = True
             
         except Exception as e:
             st.error(f"Error fetching weather data: {str(e)}")
@@ -298,13 +489,9 @@ if search_button or 'weather_data' not in st.session_state:
                 st.session_state.demo_mode = True
                 
                 # Get simulated weather data as a fallback
-                current_weather = get_demo_weather(city_name, st.session_state.unit)
-                forecast = get_demo_forecast(city_name, st.session_state.unit)
-                
-                # Store in session state
-                st.session_state.weather_data = current_weather
-                st.session_state.forecast_data = forecast
+                st.session_state.weather_data = get_demo_weather(city_name, st.session_state.unit)
                 st.session_state.last_update = datetime.datetime.now()
+                forecast_pending = True
                 
                 # Show info about demo mode
                 st.info("🧪 Using demo data - weather information is simulated")
@@ -312,171 +499,74 @@ if search_button or 'weather_data' not in st.session_state:
             elif 'weather_data' not in st.session_state:
                 st.stop()
 
-# Display current weather
 try:
-    weather_data = st.session_state.weather_data
-    forecast_data = st.session_state.forecast_data
-    
-    # Location information
-    st.header(f"Current Weather in {weather_data['name']}, {weather_data['sys']['country']}")
-    
-    # Create columns for layout
-    col1, col2, col3 = st.columns([1, 1, 1])
-    
-    # Column 1: Basic weather info and icon
-    with col1:
-        weather_condition = weather_data['weather'][0]['description'].capitalize()
-        
-        # Weather icon display
-        weather_icon = get_weather_icon(weather_data['weather'][0]['icon'])
-        st.markdown(f'<div style="text-align: center; font-size: 100px;">{weather_icon}</div>', unsafe_allow_html=True)
-        
-        st.markdown(f"<h2 style='text-align: center;'>{weather_condition}</h2>", unsafe_allow_html=True)
-        
-        # Display temperature with color
-        temp = weather_data['main']['temp']
-        temp_unit = "°C" if st.session_state.unit == 'metric' else "°F"
-        temp_color = temperature_color(temp, st.session_state.unit)
-        st.markdown(f"<h1 style='text-align: center; color: {temp_color};'>{temp:.1f}{temp_unit}</h1>", unsafe_allow_html=True)
-        
-        # Feels like temperature
-        feels_like = weather_data['main']['feels_like']
-        st.markdown(f"<p style='text-align: center;'>Feels like: {feels_like:.1f}{temp_unit}</p>", unsafe_allow_html=True)
-    
-    # Column 2: Additional weather metrics
-    with col2:
-        st.subheader("Details")
-        
-        # Min/Max temperature
-        min_temp = weather_data['main']['temp_min']
-        max_temp = weather_data['main']['temp_max']
-        st.write(f"Min/Max: {min_temp:.1f}{temp_unit} / {max_temp:.1f}{temp_unit}")
-        
-        # Humidity
-        humidity = weather_data['main']['humidity']
-        st.write(f"Humidity: {humidity}%")
-        
-        # Pressure
-        pressure = weather_data['main']['pressure']
-        st.write(f"Pressure: {pressure} hPa")
-        
-        # Visibility
-        visibility = weather_data.get('visibility', 0) / 1000  # Convert to km
-        st.write(f"Visibility: {visibility:.1f} km")
-        
-        # Cloudiness
-        clouds = weather_data['clouds']['all']
-        st.write(f"Cloudiness: {clouds}%")
+    render_current_weather(st.session_state.weather_data)
+except Exception as e:
+    st.error(f"Error displaying weather data: {str(e)}")
 
-    # Column 3: Wind information with visual indicator
-    with col3:
-        st.subheader("Wind")
-        
-        # Wind speed
-        wind_speed = weather_data['wind']['speed']
-        speed_unit = "m/s" if st.session_state.unit == 'metric' else "mph"
-        st.write(f"Speed: {wind_speed} {speed_unit}")
-        
-        # Wind direction
-        wind_deg = weather_data.get('wind', {}).get('deg', 0)
-        direction_icon = wind_direction_icon(wind_deg)
-        st.markdown(f"<p>Direction: {wind_deg}° {direction_icon}</p>", unsafe_allow_html=True)
-        
-        # Wind gust if available
-        if 'gust' in weather_data.get('wind', {}):
-            wind_gust = weather_data['wind']['gust']
-            st.write(f"Gust: {wind_gust} {speed_unit}")
-        
-        # Sunrise/Sunset times
-        timezone_offset = weather_data['timezone']
-        sunrise_time = datetime.datetime.fromtimestamp(weather_data['sys']['sunrise'] + timezone_offset - 3600)
-        sunset_time = datetime.datetime.fromtimestamp(weather_data['sys']['sunset'] + timezone_offset - 3600)
-        
-        st.write(f"Sunrise: {sunrise_time.strftime('%H:%M')}")
-        st.write(f"Sunset: {sunset_time.strftime('%H:%M')}")
+time_to_first_content = time.perf_counter() - page_start
 
-    # Forecast section
-    st.header("5-Day Forecast")
-    
-    # Process forecast data for plotting
-    forecast_dates = []
-    forecast_temps = []
-    forecast_weather_icons = []
-    forecast_weather_desc = []
-    
-    # Get daily forecasts (taking the noon forecast for each day)
-    daily_forecasts = {}
-    
-    for forecast_item in forecast_data['list']:
-        forecast_dt = datetime.datetime.fromtimestamp(forecast_item['dt'])
-        forecast_date = forecast_dt.date()
-        
-        # Use noon forecast for each day
-        if forecast_date not in daily_forecasts or (12 <= forecast_dt.hour <= 15):
-            daily_forecasts[forecast_date] = forecast_item
-    
-    # Sort by date
-    sorted_dates = sorted(daily_forecasts.keys())
-    
-    # Create forecast cards using columns
-    forecast_cols = st.columns(len(sorted_dates))
-    
-    for i, date in enumerate(sorted_dates):
-        forecast_item = daily_forecasts[date]
-        
-        with forecast_cols[i]:
-            # Date
-            st.write(f"**{date.strftime('%a, %b %d')}**")
-            
-            # Weather icon
-            icon_code = forecast_item['weather'][0]['icon']
-            weather_icon = get_weather_icon(icon_code)
-            st.markdown(f'<div style="text-align: center; font-size: 40px;">{weather_icon}</div>', unsafe_allow_html=True)
-            
-            # Weather description
-            weather_desc = forecast_item['weather'][0]['description'].capitalize()
-            st.write(f"{weather_desc}")
+# Stage 2: forecast cards and trend chart fill in below once /forecast returns
+st.header("5-Day Forecast")
+forecast_placeholder = st.empty()
+
+if forecast_pending:
+    forecast_placeholder.info("Loading forecast...")
+    try:
+        if use_demo_data():
+            forecast = get_demo_forecast(city_name, st.session_state.unit)
+            fingerprint = payload_fingerprint(forecast)
+        else:
+            # Only a refetch of the forecast already on screen counts as a refresh
+            forecast_key = (city_name.strip().lower(), st.session_state.unit)
+            is_refresh = st.session_state.get('forecast_key') == forecast_key
+            held_fingerprint = st.session_state.get('forecast_fingerprint') if is_refresh else None
             
-            # Temperature
-            temp = forecast_item['main']['temp']
-            st.write(f"**{temp:.1f}{temp_unit}**")
+            # Returns None when the forecast matches the one already processed
+            forecast, fingerprint = weather_api.get_forecast_if_changed(
+                city_name, st.session_state.unit, held_fingerprint, refresh=search_button
+            )
             
-            # Additional info
-            st.write(f"Humidity: {forecast_item['main']['humidity']}%")
-            wind_speed = forecast_item['wind']['speed']
-            st.write(f"Wind: {wind_speed} {speed_unit}")
+            if is_refresh:
+                stats = st.session_state.refresh_stats
+                stats['refreshes'] += 1
+                if forecast is None:
+                    stats['unchanged'] += 1
+                if weather_api.last_not_modified:
+                    stats['not_modified'] += 1
+        
+        if forecast is not None:
+            st.session_state.forecast_data = forecast
+            st.session_state.forecast_fingerprint = fingerprint
+            st.session_state.forecast_key = None if use_demo_data() else forecast_key
+            st.session_state.pop('forecast_view', None)
+    except Exception as e:
+        # Don't show the previous city's forecast under the new current conditions
+        for key in ('forecast_data', 'forecast_fingerprint', 'forecast_key', 'forecast_view'):
+            st.session_state.pop(key, None)
+        forecast_placeholder.error(f"Error fetching forecast data: {str(e)}")
 
-    # Temperature trend chart
-    st.subheader("Temperature Trend (48 hours)")
-    
-    # Prepare data for the chart
-    chart_data = []
-    
-    for i, forecast_item in enumerate(forecast_data['list'][:16]):  # Show first 48 hours (16 entries)
-        forecast_dt = datetime.datetime.fromtimestamp(forecast_item['dt'])
-        temp = forecast_item['main']['temp']
-        feels_like = forecast_item['main']['feels_like']
+if 'forecast_data' in st.session_state:
+    try:
+        # Only reprocess the forecast when it changed since the last build
+        if 'forecast_view' not in st.session_state:
+            st.session_state.forecast_view = build_forecast_view(st.session_state.forecast_data)
         
-        chart_data.append({
-            'Time': forecast_dt, 
-            'Temperature': temp,
-            'Feels Like': feels_like
-        })
-    
-    df = pd.DataFrame(chart_data)
-    
-    # Create interactive temperature chart
-    fig = px.line(df, x='Time', y=['Temperature', 'Feels Like'], 
-                  labels={'value': f'Temperature ({temp_unit})', 'variable': 'Metric'},
-                  template='plotly_white')
-    
-    fig.update_layout(
-        height=400,
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-        margin=dict(l=10, r=10, t=30, b=10)
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
+        with forecast_placeholder.container():
+            render_forecast(st.session_state.forecast_view)
+    except Exception as e:
+        forecast_placeholder.error(f"Error displaying weather data: {str(e)}")
 
-except Exception as e:
-    st.error(f"Error displaying weather data: {str(e)}")
+time_to_full_page = time.perf_counter() - page_start
+
+# Report perceived latency for this run in the sidebar
+st.session_state.page_timings = {
+    'first_content': time_to_first_content,
+    'full_page': time_to_full_page,
+}
+refresh_stats = st.session_state.refresh_stats
+timing_placeholder.caption(
+    f"Time to first content: {time_to_first_content:.2f}s · Full page: {time_to_full_page:.2f}s  \n"
+    f"Forecast refreshes: {refresh_stats['refreshes']} · "
+    f"unchanged: {refresh_stats['unchanged']} · not modified (304): {refresh_stats['not_modified']}"
+)
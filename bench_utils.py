@@ -0,0 +1,62 @@
+"""
+Micro-benchmarks for the mapping helpers in utils.py.
+
+Compares the per-item helpers against their vectorized counterparts.
+Run with: python bench_utils.py [--size N] [--repeat R]
+"""
+import argparse
+import random
+import timeit
+
+from utils import (
+    WEATHER_ICONS,
+    get_weather_icon,
+    get_weather_icons,
+    temperature_color,
+    temperature_colors,
+    wind_direction_icon,
+    wind_direction_icons,
+)
+
+def make_inputs(size):
+    """
+    Build random icon codes, temperatures and wind directions.
+    """
+    codes = list(WEATHER_ICONS) + ['xxx']
+    icon_codes = [random.choice(codes) for _ in range(size)]
+    temps = [random.uniform(-30, 45) for _ in range(size)]
+    degrees = [random.randint(0, 359) for _ in range(size)]
+    return icon_codes, temps, degrees
+
+def run(size, repeat):
+    """
+    Time each helper pair and print the results.
+    """
+    icon_codes, temps, degrees = make_inputs(size)
+
+    cases = [
+        ("weather icon",
+         lambda: [get_weather_icon(c) for c in icon_codes],
+         lambda: get_weather_icons(icon_codes)),
+        ("temperature color",
+         lambda: [temperature_color(t) for t in temps],
+         lambda: temperature_colors(temps)),
+        ("wind direction",
+         lambda: [wind_direction_icon(d) for d in degrees],
+         lambda: wind_direction_icons(degrees)),
+    ]
+
+    print(f"{size:,} items, best of {repeat}")
+    for name, scalar, vectorized in cases:
+        scalar_time = min(timeit.repeat(scalar, number=1, repeat=repeat))
+        vector_time = min(timeit.repeat(vectorized, number=1, repeat=repeat))
+        print(f"{name:<18} scalar: {scalar_time * 1000:8.2f} ms   "
+              f"vectorized: {vector_time * 1000:8.2f} ms   "
+              f"speedup: {scalar_time / vector_time:5.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the weather mapping helpers")
+    parser.add_argument("--size", type=int, default=200_000, help="Number of items per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timing runs")
+    args = parser.parse_args()
+    run(args.size, args.repeat)
@@ -0,0 +1,466 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+RATE_LIMIT_ERROR = "API rate limit reached. Please try again in a minute."
+
+class RateLimiter:
+    """
+    A thread-safe token bucket limiting API calls within one process.
+    """
+
+    def __init__(self, calls_per_minute=60):
+        """
+        Initialize the limiter with a full bucket.
+
+        Args:
+            calls_per_minute (float): Sustained call budget, also the burst size
+        """
+        self.capacity = calls_per_minute
+        self.refill_rate = calls_per_minute / 60.0
+        self._tokens = float(calls_per_minute)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait=30):
+        """
+        Take one token, sleeping until one is available.
+
+        Args:
+            max_wait (float): Longest time to wait in seconds, or None to wait as long as it takes
+
+        Raises:
+            Exception: If no token becomes available within max_wait
+        """
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.refill_rate
+
+            if deadline is not None and now + wait_time > deadline:
+                raise Exception(RATE_LIMIT_ERROR)
+            time.sleep(wait_time)
+
+class MemoryCache:
+    """
+    A thread-safe in-process cache for API responses with a time-to-live.
+
+    Also holds the process's API rate limiter, see acquire().
+    """
+
+    def __init__(self, ttl=600, max_entries=1024, calls_per_minute=60, stale_ttl=86400):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl (float): Seconds an entry stays fresh
+            max_entries (int): Maximum number of entries kept before evicting the oldest
+            calls_per_minute (float): API call budget shared by all users of the cache
+            stale_ttl (float): Seconds an expired entry is still kept for get(..., allow_stale=True)
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.rate_limiter = RateLimiter(calls_per_minute)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key, allow_stale=False):
+        """
+        Return the cached value for a key, or None if it is missing or expired.
+
+        With allow_stale, expired entries are returned until stale_ttl runs out,
+        e.g. to revalidate them with a conditional request.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            now = time.monotonic()
+            if expires_at + self.stale_ttl < now:
+                del self._entries[key]
+                return None
+            if expires_at < now and not allow_stale:
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Store a value under a key.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_fetch(self, key, fetch, refresh=False, max_wait=None):
+        """
+        Return the cached value for a key, calling fetch() to fill it on a miss.
+
+        Concurrent callers asking for the same key wait for a single fetch
+        instead of each hitting the API.
+
+        Args:
+            key (str): Cache key
+            fetch (callable): Function returning the value to cache
+            refresh (bool): Ignore the cached value and fetch again - a fetch
+                already in progress for the key is shared instead
+            max_wait (float): Longest time to wait for another caller's fetch,
+                or None to wait as long as it takes
+
+        Returns:
+            The cached or freshly fetched value
+
+        Raises:
+            Exception: If another caller's fetch doesn't finish within max_wait
+        """
+        if not refresh:
+            value = self.get(key)
+            if value is not None:
+                self._count_hit()
+                return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        joined = not key_lock.acquire(blocking=False)
+        if joined and not key_lock.acquire(timeout=-1 if max_wait is None else max_wait):
+            raise Exception(RATE_LIMIT_ERROR)
+
+        try:
+            # Another thread may have filled the entry while we waited
+            if not refresh or joined:
+                value = self.get(key)
+                if value is not None:
+                    self._count_hit()
+                    return value
+
+            with self._lock:
+                self.misses += 1
+            value = fetch()
+            self.set(key, value)
+            return value
+        finally:
+            key_lock.release()
+            with self._lock:
+                # A newer fetcher may have registered its own lock for the key
+                if self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+
+    def acquire(self, max_wait=30):
+        """
+        Take one API call from the rate budget, waiting up to max_wait seconds
+        (None to wait as long as it takes).
+        """
+        self.rate_limiter.acquire(max_wait)
+
+    def _count_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteCache:
+    """
+    A response cache and rate limiter shared by every process on the host.
+
+    State lives in one SQLite file, so several Streamlit workers (or export
+    runs) share cached responses and a single API call budget. Token
+    accounting happens inside write transactions, and a lease row per key
+    makes sure only one process fetches a given city at a time.
+    """
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, path, ttl=600, calls_per_minute=60, lease_timeout=30, stale_ttl=86400):
+        """
+        Initialize the cache, creating the database file and tables if needed.
+
+        Args:
+            path (str): Path of the SQLite database file
+            ttl (float): Seconds an entry stays fresh
+            calls_per_minute (float): API call budget shared by all processes
+            stale_ttl (float): Seconds an expired entry is still kept for get(..., allow_stale=True)
+            lease_timeout (float): Seconds after which an unfinished fetch is taken over -
+                must exceed the HTTP request timeout. A leaseholder waiting for a
+                rate-limit token keeps renewing its lease, so the wait itself doesn't count.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.capacity = calls_per_minute
+        self.refill_rate = calls_per_minute / 60.0
+        self.lease_timeout = lease_timeout
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self._owner = uuid.uuid4().hex
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS rate_limit (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+        conn.execute(
+            "INSERT OR IGNORE INTO rate_limit (id, tokens, updated_at) VALUES (1, ?, ?)",
+            (float(calls_per_minute), time.time()),
+        )
+
+    def _connection(self):
+        """
+        Return this thread's connection, opening it on first use.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, allow_stale=False):
+        """
+        Return the cached value for a key, or None if it is missing or expired.
+
+        With allow_stale, expired entries are returned until stale_ttl runs out,
+        e.g. to revalidate them with a conditional request.
+        """
+        oldest = time.time() - (self.stale_ttl if allow_stale else 0)
+        row = self._connection().execute(
+            "SELECT value FROM responses WHERE key = ? AND expires_at >= ?",
+            (key, oldest),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value):
+        """
+        Store a value under a key and drop entries past their stale_ttl.
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl),
+            )
+            conn.execute("DELETE FROM responses WHERE expires_at < ?", (now - self.stale_ttl,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_or_fetch(self, key, fetch, refresh=False, max_wait=None):
+        """
+        Return the cached value for a key, calling fetch() to fill it on a miss.
+
+        Callers in any process asking for the same key wait for the one that
+        holds the lease instead of each hitting the API.
+
+        Args:
+            key (str): Cache key
+            fetch (callable): Function returning a JSON-serializable value to cache
+            refresh (bool): Ignore the cached value and fetch again - a fetch
+                already in progress for the key is shared instead
+            max_wait (float): Longest time to wait for another caller's fetch,
+                or None to wait as long as it takes
+
+        Returns:
+            The cached or freshly fetched value
+
+        Raises:
+            Exception: If another caller's fetch doesn't finish within max_wait
+        """
+        deadline = None if max_wait is None else time.time() + max_wait
+        waited = False
+        while True:
+            # A refresh that found a fetch in progress only takes the value
+            # once that fetch has finished and released its lease
+            if not refresh or (waited and not self._lease_held(key)):
+                value = self.get(key)
+                if value is not None:
+                    self._count_hit()
+                    return value
+
+            if self._take_lease(key):
+                break
+            # The leaseholder may itself be queued for a rate-limit token
+            if deadline is not None and time.time() >= deadline:
+                raise Exception(RATE_LIMIT_ERROR)
+            waited = True
+            time.sleep(self.POLL_INTERVAL)
+
+        try:
+            # The previous leaseholder may have stored the value and released
+            # the lease between our cache check and taking the lease
+            if not refresh or waited:
+                value = self.get(key)
+                if value is not None:
+                    self._count_hit()
+                    return value
+
+            with self._lock:
+                self.misses += 1
+            value = fetch()
+            self.set(key, value)
+            return value
+        finally:
+            self._connection().execute(
+                "DELETE FROM leases WHERE key = ? AND owner = ?", (key, self._owner)
+            )
+
+    def _lease_held(self, key):
+        """
+        Whether another fetch currently holds an unexpired lease on a key.
+        """
+        row = self._connection().execute(
+            "SELECT 1 FROM leases WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def _take_lease(self, key):
+        """
+        Try to become the fetcher for a key.
+
+        Returns:
+            bool: True if the lease was taken, False if another fetch is in progress
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] >= now:
+                conn.execute("COMMIT")
+                return False
+
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                (key, self._owner, now + self.lease_timeout),
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire(self, max_wait=30):
+        """
+        Take one API call from the shared rate budget, waiting up to max_wait
+        seconds (None to wait as long as it takes).
+
+        Every attempt also renews this process's fetch leases, so other
+        processes keep waiting on a fetch that is only queued for a token.
+
+        Raises:
+            Exception: If no token becomes available within max_wait
+        """
+        deadline = None if max_wait is None else time.time() + max_wait
+        conn = self._connection()
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                conn.execute(
+                    "UPDATE leases SET expires_at = ? WHERE owner = ?",
+                    (now + self.lease_timeout, self._owner),
+                )
+                tokens, updated_at = conn.execute(
+                    "SELECT tokens, updated_at FROM rate_limit WHERE id = 1"
+                ).fetchone()
+                tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.refill_rate)
+                granted = tokens >= 1
+                if granted:
+                    tokens -= 1
+                conn.execute(
+                    "UPDATE rate_limit SET tokens = ?, updated_at = ? WHERE id = 1", (tokens, now)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            if granted:
+                return
+            wait_time = (1 - tokens) / self.refill_rate
+            if deadline is not None and now + wait_time > deadline:
+                raise Exception(RATE_LIMIT_ERROR)
+            # Wake up often enough to renew leases before they expire
+            time.sleep(min(wait_time, self.lease_timeout / 3))
+
+    def _count_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        self._connection().execute("DELETE FROM responses")
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache():
+    """
+    Return the process-wide response cache, creating it on first use.
+
+    Configured through environment variables:
+        WEATHER_CACHE_BACKEND: 'memory' (default, per process) or 'sqlite' (shared by all processes on the host)
+        WEATHER_CACHE_PATH: SQLite database file (default: weather_cache.sqlite3 in the temp directory)
+        WEATHER_CACHE_TTL: Seconds an entry stays fresh (default 600)
+        WEATHER_RATE_LIMIT: API calls allowed per minute (default 60)
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            backend = os.getenv("WEATHER_CACHE_BACKEND", "memory").lower()
+            ttl = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+            calls_per_minute = float(os.getenv("WEATHER_RATE_LIMIT", "60"))
+
+            if backend == "sqlite":
+                path = os.getenv("WEATHER_CACHE_PATH", os.path.join(tempfile.gettempdir(), "weather_cache.sqlite3"))
+                _default_cache = SQLiteCache(path, ttl=ttl, calls_per_minute=calls_per_minute)
+            elif backend == "memory":
+                _default_cache = MemoryCache(ttl=ttl, calls_per_minute=calls_per_minute)
+            else:
+                raise ValueError(f"Unknown WEATHER_CACHE_BACKEND '{backend}'. Use 'memory' or 'sqlite'.")
+        return _default_cache
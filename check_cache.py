@@ -0,0 +1,211 @@
+"""
+Concurrency checks for the response caches in cache.py.
+
+Runs several processes (and threads) against a throwaway SQLite cache and
+asserts the guarantees the dashboard and the batch export rely on:
+
+- each key is fetched once however many processes ask for it
+- the shared rate budget never grants more than the bucket allows
+- a refresh that finds a fetch in progress gets that fetch's result
+- a caller waiting on another caller's fetch gives up after max_wait
+
+Run with: python check_cache.py [--processes N]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from cache import RATE_LIMIT_ERROR, MemoryCache, SQLiteCache
+
+KEYS = ['forecast:london:metric', 'forecast:paris:metric', 'forecast:tokyo:metric']
+
+def _single_flight_worker(path, fetches, results):
+    cache = SQLiteCache(path)
+
+    def fetch(key):
+        def run():
+            fetches.put(key)
+            time.sleep(0.3)
+            return {'key': key}
+        return run
+
+    results.put([cache.get_or_fetch(key, fetch(key)) for key in KEYS])
+
+def check_single_flight(path, processes):
+    """
+    Every process asks for the same keys at once; each key is fetched once.
+    """
+    fetches, results = multiprocessing.Queue(), multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_single_flight_worker, args=(path, fetches, results))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    values = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    fetched = []
+    while not fetches.empty():
+        fetched.append(fetches.get())
+
+    assert sorted(fetched) == sorted(KEYS), f"expected one fetch per key, got {sorted(fetched)}"
+    assert all(value == [{'key': key} for key in KEYS] for value in values), values
+    return f"{processes} processes, {len(KEYS)} keys, {len(fetched)} fetches"
+
+def _token_worker(path, calls_per_minute, count, grants):
+    cache = SQLiteCache(path, calls_per_minute=calls_per_minute)
+    for _ in range(count):
+        cache.acquire(max_wait=None)
+        grants.put(time.time())
+
+def check_token_budget(path, processes, calls_per_minute=600, extra=30):
+    """
+    Processes drain the shared bucket past its capacity; the grants seen by
+    any point in time never exceed the burst plus what has refilled since.
+    """
+    capacity = calls_per_minute
+    rate = calls_per_minute / 60.0
+    per_process = (capacity + extra) // processes + 1
+
+    # Creating the cache fills the bucket, so the budget is measured from here
+    SQLiteCache(path, calls_per_minute=calls_per_minute)
+    start = time.time()
+
+    grants = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_token_worker,
+                                       args=(path, calls_per_minute, per_process, grants))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    times = sorted(grants.get(timeout=120) for _ in range(per_process * processes))
+    for worker in workers:
+        worker.join()
+
+    # Grant times are taken after acquire() returns, so they can only run late
+    for granted, at in enumerate(times, 1):
+        allowed = capacity + rate * (at - start)
+        assert granted <= allowed + 1e-6, \
+            f"{granted} grants after {at - start:.2f}s, budget allows {allowed:.1f}"
+    return f"{len(times)} grants over {times[-1] - start:.1f}s, burst {capacity}, {rate:g}/s"
+
+def _slow_refresh_worker(path, started):
+    cache = SQLiteCache(path)
+
+    def fetch():
+        started.set()
+        time.sleep(1.0)
+        return {'v': 'new'}
+
+    cache.get_or_fetch('refresh', fetch, refresh=True)
+
+def check_refresh_joins_fetch(path):
+    """
+    A refresh that arrives while another process refreshes the same key gets
+    the new value without fetching again.
+    """
+    cache = SQLiteCache(path)
+    cache.set('refresh', {'v': 'old'})
+
+    started = multiprocessing.Event()
+    holder = multiprocessing.Process(target=_slow_refresh_worker, args=(path, started))
+    holder.start()
+    assert started.wait(10), "the refreshing process never started its fetch"
+
+    fetched = []
+    value = cache.get_or_fetch('refresh', lambda: fetched.append(1) or {'v': 'second'}, refresh=True)
+    holder.join()
+
+    assert value == {'v': 'new'}, f"expected the running fetch's value, got {value}"
+    assert not fetched, "the second refresh fetched again"
+    return "second refresh returned the running fetch's value"
+
+def _holding_worker(path, started, hold):
+    cache = SQLiteCache(path)
+
+    def fetch():
+        started.set()
+        time.sleep(hold)
+        return {'v': 'held'}
+
+    cache.get_or_fetch('held', fetch)
+
+def check_lease_wait(path, max_wait=0.5, hold=3.0):
+    """
+    A caller stuck behind a slow leaseholder raises the rate-limit error
+    once max_wait has passed instead of waiting for the holder.
+    """
+    started = multiprocessing.Event()
+    holder = multiprocessing.Process(target=_holding_worker, args=(path, started, hold))
+    holder.start()
+    assert started.wait(10), "the holding process never started its fetch"
+
+    cache = SQLiteCache(path)
+    begin = time.time()
+    try:
+        cache.get_or_fetch('held', lambda: {'v': 'waiter'}, max_wait=max_wait)
+    except Exception as e:
+        assert str(e) == RATE_LIMIT_ERROR, f"unexpected error: {e}"
+    else:
+        raise AssertionError("the waiter fetched instead of waiting for the lease")
+    waited = time.time() - begin
+    holder.join()
+
+    assert waited < max_wait + 0.5, f"max_wait was {max_wait}s but the waiter gave up after {waited:.2f}s"
+    return f"waiter gave up after {waited:.2f}s (max_wait {max_wait}s, holder {hold}s)"
+
+def check_memory_refresh(threads):
+    """
+    Threads refreshing the same key of a MemoryCache share a single fetch.
+    """
+    cache = MemoryCache()
+    cache.set('refresh', {'v': 'old'})
+    fetches = []
+    results = []
+    barrier = threading.Barrier(threads)
+
+    def fetch():
+        fetches.append(1)
+        time.sleep(0.3)
+        return {'v': 'new'}
+
+    def run():
+        barrier.wait()
+        results.append(cache.get_or_fetch('refresh', fetch, refresh=True))
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(fetches) == 1, f"expected one fetch, got {len(fetches)}"
+    assert results == [{'v': 'new'}] * threads, results
+    return f"{threads} threads, {len(fetches)} fetch"
+
+def run(processes):
+    """
+    Run every check against its own cache file and print the results.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        def path(name):
+            return os.path.join(directory, f"{name}.sqlite3")
+
+        cases = [
+            ("single flight", lambda: check_single_flight(path('single_flight'), processes)),
+            ("token budget", lambda: check_token_budget(path('token_budget'), processes)),
+            ("refresh joins fetch", lambda: check_refresh_joins_fetch(path('refresh'))),
+            ("lease wait", lambda: check_lease_wait(path('lease_wait'))),
+            ("memory refresh", lambda: check_memory_refresh(processes * 2)),
+        ]
+
+        for name, check in cases:
+            print(f"{name:<20} ok  {check()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the cache concurrency guarantees")
+    parser.add_argument("--processes", type=int, default=4, help="Number of competing processes")
+    args = parser.parse_args()
+    run(args.processes)
@@ -0,0 +1,338 @@
+"""
+Headless batch export of daily forecast summaries.
+
+Fetches the forecast for each city through WeatherAPI, picks one entry per
+day the same way the dashboard does, and streams the summaries to a JSONL,
+CSV or Parquet file. Cities are read lazily and only a bounded number of
+fetches are in flight at once, so memory stays flat however long the list is.
+
+Example:
+    python export.py --cities-file cities.txt --output forecasts.jsonl
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from weather import WeatherAPI
+from utils import get_daily_forecasts, get_weather_icons, temperature_colors, wind_direction_icons
+
+FIELDS = [
+    'city',
+    'country',
+    'date',
+    'dt',
+    'icon_code',
+    'icon',
+    'description',
+    'temp',
+    'feels_like',
+    'temp_color',
+    'humidity',
+    'wind_speed',
+    'wind_deg',
+    'wind_direction',
+    'units',
+]
+
+def iter_cities(cities, cities_handle=None):
+    """
+    Yield city names from the command line and then from an open file.
+
+    Names are stripped, and blank lines and lines starting with '#' are skipped.
+    """
+    for line in cities:
+        city = line.strip()
+        if city:
+            yield city
+
+    if cities_handle is None:
+        return
+
+    for line in cities_handle:
+        city = line.strip()
+        if city and not city.startswith('#'):
+            yield city
+
+def summarize_forecast(city, forecast, units='metric'):
+    """
+    Build one summary row per day from a forecast response.
+
+    Args:
+        city (str): City name as requested
+        forecast (dict): OpenWeather forecast response
+        units (str): Unit system the forecast was requested in
+
+    Returns:
+        list: Summary dicts with the keys in FIELDS
+    """
+    daily_forecasts = get_daily_forecasts(forecast['list'])
+    items = [item for _, item in daily_forecasts]
+
+    icons = get_weather_icons([item['weather'][0]['icon'] for item in items])
+    colors = temperature_colors([item['main']['temp'] for item in items], units)
+    directions = wind_direction_icons([item['wind'].get('deg', 0) for item in items])
+
+    country = forecast.get('city', {}).get('country', '')
+    rows = []
+    for i, (date, item) in enumerate(daily_forecasts):
+        rows.append({
+            'city': city,
+            'country': country,
+            'date': date.isoformat(),
+            'dt': item['dt'],
+            'icon_code': item['weather'][0]['icon'],
+            'icon': icons[i],
+            'description': item['weather'][0]['description'],
+            'temp': item['main']['temp'],
+            'feels_like': item['main']['feels_like'],
+            'temp_color': colors[i],
+            'humidity': item['main']['humidity'],
+            'wind_speed': item['wind']['speed'],
+            'wind_deg': item['wind'].get('deg', 0),
+            'wind_direction': directions[i],
+            'units': units,
+        })
+    return rows
+
+class JSONLWriter:
+    """
+    Writes summary rows as one JSON object per line.
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.handle.write(json.dumps(row, ensure_ascii=False))
+            self.handle.write('\n')
+
+    def close(self):
+        self.handle.flush()
+
+class CSVWriter:
+    """
+    Writes summary rows as CSV with a header line.
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.writer = csv.DictWriter(handle, fieldnames=FIELDS)
+        self.writer.writeheader()
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.handle.flush()
+
+class ParquetWriter:
+    """
+    Writes summary rows to a Parquet file, one row group per batch.
+
+    Uses pyarrow, which is installed with streamlit. It is imported here so
+    JSONL and CSV exports don't pay for loading it.
+    """
+
+    def __init__(self, path, batch_size=5000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.batch_size = batch_size
+        self.schema = pa.schema([
+            ('city', pa.string()),
+            ('country', pa.string()),
+            ('date', pa.string()),
+            ('dt', pa.int64()),
+            ('icon_code', pa.string()),
+            ('icon', pa.string()),
+            ('description', pa.string()),
+            ('temp', pa.float64()),
+            ('feels_like', pa.float64()),
+            ('temp_color', pa.string()),
+            ('humidity', pa.int64()),
+            ('wind_speed', pa.float64()),
+            ('wind_deg', pa.int64()),
+            ('wind_direction', pa.string()),
+            ('units', pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.buffer = []
+
+    def write_rows(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.buffer:
+            self.writer.write_table(self.pa.Table.from_pylist(self.buffer, schema=self.schema))
+            self.buffer = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+def detect_format(output, fmt=None):
+    """
+    Return the output format, inferring it from the file extension when not given.
+    """
+    if fmt:
+        return fmt
+    if output.endswith('.csv'):
+        return 'csv'
+    if output.endswith('.parquet'):
+        return 'parquet'
+    return 'jsonl'
+
+def open_writer(output, fmt):
+    """
+    Open a row writer for the output path ('-' for stdout) and format.
+
+    Returns:
+        tuple: (writer, file handle to close or None)
+    """
+    if fmt == 'parquet':
+        if output == '-':
+            raise ValueError("Parquet output cannot be written to stdout.")
+        return ParquetWriter(output), None
+
+    if output == '-':
+        handle = sys.stdout
+    else:
+        handle = open(output, 'w', encoding='utf-8', newline='')
+
+    writer = CSVWriter(handle) if fmt == 'csv' else JSONLWriter(handle)
+    return writer, (None if handle is sys.stdout else handle)
+
+def export_forecasts(api, cities, writer, units='metric', workers=4, progress_every=0):
+    """
+    Fetch and summarize forecasts for many cities, streaming rows to a writer.
+
+    At most workers * 2 fetches are queued at once and rows are written in
+    completion order.
+
+    Args:
+        api (WeatherAPI): API client used for fetching
+        cities (iterable): City names
+        writer: Object with a write_rows(rows) method
+        units (str): Unit system - 'metric' (Celsius) or 'imperial' (Fahrenheit)
+        workers (int): Number of concurrent fetches
+        progress_every (int): Report progress to stderr every N cities (0 to disable)
+
+    Returns:
+        dict: Counts of cities, failures and rows, and the elapsed seconds
+    """
+    stats = {'cities': 0, 'failed': 0, 'rows': 0, 'elapsed': 0.0}
+    start = time.perf_counter()
+
+    def process(city):
+        return summarize_forecast(city, api.get_forecast(city, units), units)
+
+    def collect(done):
+        for future in done:
+            city = pending.pop(future)
+            stats['cities'] += 1
+            try:
+                rows = future.result()
+            except Exception as e:
+                stats['failed'] += 1
+                print(f"{city}: {e}", file=sys.stderr)
+            else:
+                writer.write_rows(rows)
+                stats['rows'] += len(rows)
+
+            if progress_every and stats['cities'] % progress_every == 0:
+                report(stats, time.perf_counter() - start)
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for city in cities:
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[executor.submit(process, city)] = city
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    stats['elapsed'] = time.perf_counter() - start
+    return stats
+
+def report(stats, elapsed):
+    """
+    Print a throughput line to stderr.
+    """
+    rate = stats['cities'] / elapsed if elapsed > 0 else 0.0
+    print(f"{stats['cities']} cities ({stats['failed']} failed), {stats['rows']} rows "
+          f"in {elapsed:.1f}s - {rate:.1f} cities/s", file=sys.stderr)
+
+def positive_int(value):
+    """
+    argparse type for options that must be at least 1.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export daily forecast summaries for many cities")
+    parser.add_argument("cities", nargs="*", help="City names to export")
+    parser.add_argument("--cities-file", help="File with one city per line ('-' for stdin)")
+    parser.add_argument("--output", "-o", default="-", help="Output path ('-' for stdout)")
+    parser.add_argument("--format", choices=["jsonl", "csv", "parquet"],
+                        help="Output format (default: from the output extension, else jsonl)")
+    parser.add_argument("--units", choices=["metric", "imperial"], default="metric")
+    parser.add_argument("--workers", type=positive_int, default=4, help="Number of concurrent fetches")
+    parser.add_argument("--progress-every", type=int, default=0,
+                        help="Report throughput every N cities")
+    args = parser.parse_args(argv)
+
+    if not args.cities and not args.cities_file:
+        parser.error("give at least one city or --cities-file")
+
+    cities_handle = None
+    try:
+        # Open the input before the output so a bad path doesn't truncate an existing export
+        if args.cities_file == '-':
+            cities_handle = sys.stdin
+        elif args.cities_file:
+            cities_handle = open(args.cities_file, encoding='utf-8')
+        # Batch runs slow down to the rate budget instead of dropping cities
+        api = WeatherAPI(show_status=False, rate_limit_wait=None)
+        writer, handle = open_writer(args.output, detect_format(args.output, args.format))
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        if cities_handle not in (None, sys.stdin):
+            cities_handle.close()
+        return 1
+
+    try:
+        stats = export_forecasts(api, iter_cities(args.cities, cities_handle), writer,
+                                 units=args.units, workers=args.workers,
+                                 progress_every=args.progress_every)
+    finally:
+        writer.close()
+        if handle is not None:
+            handle.close()
+        if cities_handle not in (None, sys.stdin):
+            cities_handle.close()
+
+    report(stats, stats['elapsed'])
+    cache = api.cache
+    print(f"Cache: {cache.hits} hits, {cache.misses} misses", file=sys.stderr)
+
+    # Non-zero exit lets cron and schedulers flag partial failures
+    return 1 if stats['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,111 +1,203 @@
+import bisect
+import datetime
+import math
+
+import numpy as np
+
+# Lookup tables are built once at import time so the mapping helpers below
+# don't rebuild them on every call.
+UNKNOWN_ICON = '❓'
+
+WEATHER_ICONS = {
+    # Clear
+    '01d': '☀️',  # clear sky day
+    '01n': '🌙',  # clear sky night
+
+    # Few clouds
+    '02d': '🌤️',  # few clouds day
+    '02n': '☁️',  # few clouds night
+
+    # Scattered clouds
+    '03d': '⛅',  # scattered clouds day
+    '03n': '☁️',  # scattered clouds night
+
+    # Broken clouds
+    '04d': '☁️',  # broken clouds day
+    '04n': '☁️',  # broken clouds night
+
+    # Shower rain
+    '09d': '🌧️',  # shower rain day
+    '09n': '🌧️',  # shower rain night
+
+    # Rain
+    '10d': '🌦️',  # rain day
+    '10n': '🌧️',  # rain night
+
+    # Thunderstorm
+    '11d': '⛈️',  # thunderstorm day
+    '11n': '⛈️',  # thunderstorm night
+
+    # Snow
+    '13d': '❄️',  # snow day
+    '13n': '❄️',  # snow night
+
+    # Mist
+    '50d': '🌫️',  # mist day
+    '50n': '🌫️',  # mist night
+}
+
+# Upper bounds (exclusive, in Celsius) of each temperature band
+TEMPERATURE_THRESHOLDS = (-10, 0, 10, 20, 25, 30, 35)
+
+TEMPERATURE_COLORS = (
+    "#0022FF",  # Very cold - deep blue
+    "#0066FF",  # Cold - blue
+    "#00AAFF",  # Cool - light blue
+    "#00CCAA",  # Mild - teal
+    "#00CC00",  # Warm - green
+    "#DDCC00",  # Hot - yellow
+    "#FF8800",  # Very hot - orange
+    "#FF0000",  # Extremely hot - red
+)
+
+# One arrow per 45° sector, starting with north (337.5° - 22.5°)
+WIND_DIRECTION_ICONS = (
+    "⬇️",  # North wind (comes from north, blows southward)
+    "↙️",  # Northeast wind
+    "⬅️",  # East wind
+    "↖️",  # Southeast wind
+    "⬆️",  # South wind
+    "↗️",  # Southwest wind
+    "➡️",  # West wind
+    "↘️",  # Northwest wind
+)
+
+# Array versions of the tables for the vectorized helpers
+_TEMPERATURE_THRESHOLDS = np.array(TEMPERATURE_THRESHOLDS, dtype=float)
+_TEMPERATURE_COLORS = np.array(TEMPERATURE_COLORS, dtype=object)
+_WIND_DIRECTION_ICONS = np.array(WIND_DIRECTION_ICONS, dtype=object)
+
 def get_weather_icon(icon_code):
     """
     Maps OpenWeather icon codes to emoji icons.
-    
+
     Args:
         icon_code (str): OpenWeather icon code
-        
+
     Returns:
         str: Emoji icon representing the weather condition
     """
-    icon_map = {
-        # Clear
-        '01d': '☀️',  # clear sky day
-        '01n': '🌙',  # clear sky night
-        
-        # Few clouds
-        '02d': '🌤️',  # few clouds day
-        '02n': '☁️',  # few clouds night
-        
-        # Scattered clouds
-        '03d': '⛅',  # scattered clouds day
-        '03n': '☁️',  # scattered clouds night
-        
-        # Broken clouds
-        '04d': '☁️',  # broken clouds day
-        '04n': '☁️',  # broken clouds night
-        
-        # Shower rain
-        '09d': '🌧️',  # shower rain day
-        '09n': '🌧️',  # shower rain night
-        
-        # Rain
-        '10d': '🌦️',  # rain day
-        '10n': '🌧️',  # rain night
-        
-        # Thunderstorm
-        '11d': '⛈️',  # thunderstorm day
-        '11n': '⛈️',  # thunderstorm night
-        
-        # Snow
-        '13d': '❄️',  # snow day
-        '13n': '❄️',  # snow night
-        
-        # Mist
-        '50d': '🌫️',  # mist day
-        '50n': '🌫️',  # mist night
-    }
-    
-    return icon_map.get(icon_code, '❓')
+    return WEATHER_ICONS.get(icon_code, UNKNOWN_ICON)
+
+def get_weather_icons(icon_codes):
+    """
+    Maps an array of OpenWeather icon codes to emoji icons.
+
+    Args:
+        icon_codes (array-like): OpenWeather icon codes
+
+    Returns:
+        numpy.ndarray: Emoji icons, one per code
+    """
+    # Icon codes are short strings, so a single pass over the dict beats a
+    # numeric search on a unicode array
+    lookup = WEATHER_ICONS.get
+    return np.array([lookup(code, UNKNOWN_ICON) for code in icon_codes], dtype=object)
 
 def temperature_color(temp, unit='metric'):
     """
     Returns a color based on the temperature.
-    
+
     Args:
         temp (float): The temperature value
         unit (str): The unit of the temperature ('metric' for Celsius, 'imperial' for Fahrenheit)
-        
+
     Returns:
         str: Hex color code
     """
     # Convert to Celsius if in Fahrenheit for consistent color mapping
     if unit == 'imperial':
         temp = (temp - 32) * 5/9
-    
-    if temp < -10:
-        return "#0022FF"  # Very cold - deep blue
-    elif temp < 0:
-        return "#0066FF"  # Cold - blue
-    elif temp < 10:
-        return "#00AAFF"  # Cool - light blue
-    elif temp < 20:
-        return "#00CCAA"  # Mild - teal
-    elif temp < 25:
-        return "#00CC00"  # Warm - green
-    elif temp < 30:
-        return "#DDCC00"  # Hot - yellow
-    elif temp < 35:
-        return "#FF8800"  # Very hot - orange
-    else:
-        return "#FF0000"  # Extremely hot - red
+
+    # NaN compares false against every threshold, so it lands in the last band
+    if temp != temp:
+        return TEMPERATURE_COLORS[-1]
+
+    return TEMPERATURE_COLORS[bisect.bisect_right(TEMPERATURE_THRESHOLDS, temp)]
+
+def temperature_colors(temps, unit='metric'):
+    """
+    Returns a color for each temperature in an array.
+
+    Args:
+        temps (array-like): Temperature values
+        unit (str): The unit of the temperatures ('metric' for Celsius, 'imperial' for Fahrenheit)
+
+    Returns:
+        numpy.ndarray: Hex color codes, one per temperature
+    """
+    temps = np.asarray(temps, dtype=float)
+
+    # Convert to Celsius if in Fahrenheit for consistent color mapping
+    if unit == 'imperial':
+        temps = (temps - 32) * 5/9
+
+    return _TEMPERATURE_COLORS[np.searchsorted(_TEMPERATURE_THRESHOLDS, temps, side='right')]
 
 def wind_direction_icon(degrees):
     """
     Returns an arrow icon pointing in the direction of the wind.
-    
+
     Args:
         degrees (int): Wind direction in degrees (meteorological)
-        
+
     Returns:
         str: Arrow icon representing wind direction
     """
-    # Normalize the degrees to ensure it falls within 0-360
-    degrees = degrees % 360
-    
-    if degrees >= 337.5 or degrees < 22.5:
-        return "⬇️"  # North wind (comes from north, blows southward)
-    elif 22.5 <= degrees < 67.5:
-        return "↙️"  # Northeast wind
-    elif 67.5 <= degrees < 112.5:
-        return "⬅️"  # East wind
-    elif 112.5 <= degrees < 157.5:
-        return "↖️"  # Southeast wind
-    elif 157.5 <= degrees < 202.5:
-        return "⬆️"  # South wind
-    elif 202.5 <= degrees < 247.5:
-        return "↗️"  # Southwest wind
-    elif 247.5 <= degrees < 292.5:
-        return "➡️"  # West wind
-    else:  # 292.5 <= degrees < 337.5
-        return "↘️"  # Northwest wind
+    # NaN and inf fall through every range check, so they land in the last sector
+    if not math.isfinite(degrees):
+        return WIND_DIRECTION_ICONS[-1]
+
+    # Shift by half a sector so north covers 337.5° - 22.5°, then bucket by 45°
+    return WIND_DIRECTION_ICONS[int((degrees % 360 + 22.5) // 45) % 8]
+
+def wind_direction_icons(degrees):
+    """
+    Returns an arrow icon for each wind direction in an array.
+
+    Args:
+        degrees (array-like): Wind directions in degrees (meteorological)
+
+    Returns:
+        numpy.ndarray: Arrow icons, one per direction
+    """
+    degrees = np.asarray(degrees, dtype=float)
+
+    # Non-finite directions go to the last sector, matching wind_direction_icon
+    finite = np.isfinite(degrees)
+    sectors = np.full(degrees.shape, len(WIND_DIRECTION_ICONS) - 1)
+    sectors[finite] = ((np.mod(degrees[finite], 360) + 22.5) // 45).astype(int) % 8
+
+    return _WIND_DIRECTION_ICONS[sectors]
+
+def get_daily_forecasts(forecast_list):
+    """
+    Picks one forecast entry per day, preferring the noon (12:00 - 15:00) entries.
+
+    Args:
+        forecast_list (list): The 'list' entries of an OpenWeather forecast response
+
+    Returns:
+        list: (date, forecast entry) tuples sorted by date
+    """
+    daily_forecasts = {}
+
+    for forecast_item in forecast_list:
+        forecast_dt = datetime.datetime.fromtimestamp(forecast_item['dt'])
+        forecast_date = forecast_dt.date()
+
+        # Use noon forecast for each day
+        if forecast_date not in daily_forecasts or (12 <= forecast_dt.hour <= 15):
+            daily_forecasts[forecast_date] = forecast_item
+
+    return sorted(daily_forecasts.items())
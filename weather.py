@@ -2,15 +2,56 @@ import requests
 import os
 import streamlit as st
 import time
+import hashlib
+import json
+
+from cache import get_default_cache
+
+def content_hash(content):
+    """
+    Hash a raw response body.
+    
+    Args:
+        content (bytes): Response body as received
+        
+    Returns:
+        str: Hex SHA-1 digest of the body
+    """
+    return hashlib.sha1(content).hexdigest()
+
+def payload_fingerprint(payload, digest=None):
+    """
+    Fingerprint an API response so unchanged refreshes can be detected cheaply.
+    
+    Args:
+        payload (dict): OpenWeather response
+        digest (str): content_hash() of the raw body the payload was parsed from,
+            if known - otherwise the payload is serialized and hashed
+        
+    Returns:
+        str: The first forecast 'dt' (or the observation 'dt') and a hash of the content
+    """
+    entries = payload.get('list')
+    first_dt = entries[0]['dt'] if entries else payload.get('dt', '')
+    if digest is None:
+        digest = content_hash(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    return f"{first_dt}:{digest}"
 
 class WeatherAPI:
     """
     A class to handle interactions with the OpenWeather API.
     """
     
-    def __init__(self):
+    def __init__(self, cache=None, show_status=True, timeout=10, rate_limit_wait=30):
         """
         Initialize the WeatherAPI with the API key from environment variables.
+        
+        Args:
+            cache: Response cache to use - defaults to the process-wide cache
+            show_status (bool): Render the API key status widgets in the Streamlit sidebar
+            timeout (float): Seconds to wait for an API response
+            rate_limit_wait (float): Seconds to wait for the rate budget before failing,
+                or None to wait as long as it takes (for batch jobs)
         """
         # Get API key from environment variables with a default fallback for development
         self.api_key = os.getenv("OPENWEATHER_API_KEY", "")
@@ -18,6 +59,17 @@ class WeatherAPI:
             raise ValueError("OpenWeather API key not found. Please set the OPENWEATHER_API_KEY environment variable.")
         
         self.base_url = "https://api.openweathermap.org/data/2.5"
+        self.cache = cache if cache is not None else get_default_cache()
+        self.timeout = timeout
+        self.rate_limit_wait = rate_limit_wait
+        
+        # When the data returned by the most recent call was fetched from the API,
+        # and whether upstream answered that fetch with 304 Not Modified
+        self.last_fetched_at = None
+        self.last_not_modified = False
+        
+        if not show_status:
+            return
         
         # Display API key status
         st.sidebar.expander("API Key Status").write(f"""
@@ -33,13 +85,14 @@ class WeatherAPI:
         if st.sidebar.button("Test API Key"):
             self.test_api_key()
     
-    def get_current_weather(self, city, units='metric'):
+    def get_current_weather(self, city, units='metric', refresh=False):
         """
         Get current weather data for a specified city.
         
         Args:
             city (str): City name to get weather data for
             units (str): Unit system - 'metric' (Celsius) or 'imperial' (Fahrenheit)
+            refresh (bool): Fetch from the API even if a cached response is fresh
             
         Returns:
             dict: Current weather data
@@ -47,50 +100,16 @@ class WeatherAPI:
         Raises:
             Exception: If the API request fails
         """
-        endpoint = f"{self.base_url}/weather"
-        params = {
-            'q': city,
-            'appid': self.api_key,
-            'units': units
-        }
-        
-        response = None
-        try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()  # Raise an exception for 4XX/5XX responses
-            
-            return response.json()
-        
-        except requests.exceptions.HTTPError as http_err:
-            if response and response.status_code == 404:
-                raise Exception(f"City '{city}' not found. Please check the spelling and try again.")
-            elif response and response.status_code == 401:
-                # Try to get more detailed error message
-                try:
-                    error_data = response.json()
-                    error_message = error_data.get('message', 'Invalid API key')
-                    raise Exception(f"API key error: {error_message}. New API keys can take up to 2 hours to activate.")
-                except:
-                    raise Exception("Invalid API key. Please check your OpenWeather API key.")
-            else:
-                raise Exception(f"HTTP error occurred: {http_err}")
-        
-        except requests.exceptions.ConnectionError:
-            raise Exception("Network error. Please check your internet connection.")
-        
-        except requests.exceptions.Timeout:
-            raise Exception("Request timed out. Please try again later.")
-        
-        except requests.exceptions.RequestException as err:
-            raise Exception(f"An error occurred: {err}")
+        return self._get("weather", city, units, refresh)
     
-    def get_forecast(self, city, units='metric'):
+    def get_forecast(self, city, units='metric', refresh=False):
         """
         Get 5-day weather forecast data for a specified city.
         
         Args:
             city (str): City name to get forecast data for
             units (str): Unit system - 'metric' (Celsius) or 'imperial' (Fahrenheit)
+            refresh (bool): Fetch from the API even if a cached response is fresh
             
         Returns:
             dict: Forecast weather data
@@ -98,31 +117,127 @@ class WeatherAPI:
         Raises:
             Exception: If the API request fails
         """
-        endpoint = f"{self.base_url}/forecast"
+        return self._get("forecast", city, units, refresh)
+    
+    def get_forecast_if_changed(self, city, units='metric', fingerprint=None, refresh=False):
+        """
+        Get the forecast only if it differs from the one the caller already has.
+        
+        Args:
+            city (str): City name to get forecast data for
+            units (str): Unit system - 'metric' (Celsius) or 'imperial' (Fahrenheit)
+            fingerprint (str): Fingerprint of the forecast the caller holds, if any
+            refresh (bool): Fetch from the API even if a cached response is fresh
+            
+        Returns:
+            tuple: (forecast data, or None if unchanged, and its fingerprint)
+            
+        Raises:
+            Exception: If the API request fails
+        """
+        entry = self._get_entry("forecast", city, units, refresh)
+        
+        if entry['fingerprint'] == fingerprint:
+            return None, fingerprint
+        
+        return entry['payload'], entry['fingerprint']
+    
+    def _cache_key(self, path, city, units):
+        return f"{path}:{city.strip().lower()}:{units}"
+    
+    def _get(self, path, city, units, refresh=False):
+        """
+        Fetch an endpoint for a city, serving repeated requests from the cache.
+        """
+        return self._get_entry(path, city, units, refresh)['payload']
+    
+    def _get_entry(self, path, city, units, refresh=False):
+        """
+        Fetch the cache entry for an endpoint: the payload with its fetch time,
+        fingerprint and upstream validators.
+        """
+        key = self._cache_key(path, city, units)
+        entry = self.cache.get_or_fetch(
+            key, lambda: self._request(key, path, city, units), refresh, self.rate_limit_wait
+        )
+        self.last_fetched_at = entry['fetched_at']
+        self.last_not_modified = entry['not_modified']
+        return entry
+    
+    def _request(self, key, path, city, units):
+        """
+        Make the HTTP request for an endpoint, within the shared rate budget.
+        
+        The previous entry is read even after it went stale so its validators
+        can turn the request into a conditional one.
+        """
+        previous = self.cache.get(key, allow_stale=True)
+        self.cache.acquire(self.rate_limit_wait)
+        return self._send(path, city, units, previous)
+    
+    def _send(self, path, city, units, previous=None):
+        """
+        Send the HTTP request for an endpoint and translate errors into readable messages.
+        
+        Sends If-None-Match / If-Modified-Since when upstream gave validators
+        for the previous entry, and reuses that entry's payload on 304 or when
+        the body is byte-for-byte the one it was parsed from.
+        """
+        endpoint = f"{self.base_url}/{path}"
         params = {
             'q': city,
             'appid': self.api_key,
             'units': units
         }
         
+        headers = {}
+        if previous is not None:
+            if previous['etag']:
+                headers['If-None-Match'] = previous['etag']
+            if previous['last_modified']:
+                headers['If-Modified-Since'] = previous['last_modified']
+        
         response = None
         try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
+            response = requests.get(endpoint, params=params, headers=headers, timeout=self.timeout)
+            
+            if response.status_code == 304 and previous is not None:
+                # Same payload and fingerprint, no need to parse or hash anything
+                return dict(previous, fetched_at=time.time(), not_modified=True)
+            
+            response.raise_for_status()  # Raise an exception for 4XX/5XX responses
+            
+            digest = content_hash(response.content)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            
+            if previous is not None and previous.get('content_hash') == digest:
+                # Upstream resent the same body, so skip parsing it again
+                return dict(previous, fetched_at=time.time(), etag=etag,
+                            last_modified=last_modified, not_modified=False)
             
-            return response.json()
+            payload = response.json()
+            return {
+                'payload': payload,
+                'fetched_at': time.time(),
+                'fingerprint': payload_fingerprint(payload, digest),
+                'content_hash': digest,
+                'etag': etag,
+                'last_modified': last_modified,
+                'not_modified': False,
+            }
         
         except requests.exceptions.HTTPError as http_err:
-            if response and response.status_code == 404:
+            if response is not None and response.status_code == 404:
                 raise Exception(f"City '{city}' not found. Please check the spelling and try again.")
-            elif response and response.status_code == 401:
+            elif response is not None and response.status_code == 401:
                 # Try to get more detailed error message
                 try:
                     error_data = response.json()
                     error_message = error_data.get('message', 'Invalid API key')
-                    raise Exception(f"API key error: {error_message}. New API keys can take up to 2 hours to activate.")
-                except:
+                except ValueError:
                     raise Exception("Invalid API key. Please check your OpenWeather API key.")
+                raise Exception(f"API key error: {error_message}. New API keys can take up to 2 hours to activate.")
             else:
                 raise Exception(f"HTTP error occurred: {http_err}")
         